@@ -8,10 +8,19 @@ import json
 import os
 import base64
 import urllib.parse
-import urllib.request
+import http.client
 import ssl
+import re
 from datetime import datetime, timedelta
 
+# Use orjson for parsing the API response when available, it is much faster
+# than the stdlib parser; both accept the raw response bytes
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # Configuration - read from environment variables
 ZIPCODE = os.getenv('ZIPCODE')
 if not ZIPCODE:
@@ -22,15 +31,103 @@ if not ZIPCODE:
 KCBS_USERNAME = os.getenv('KCBS_USERNAME', '')
 KCBS_PASSWORD = os.getenv('KCBS_PASSWORD', '')
 
+# Set KCBS_VERBOSE=1 to list every parsed event on stdout
+VERBOSE = os.getenv('KCBS_VERBOSE') == '1'
+
 RADIUS = "175"
 OUTPUT_FILE = "FinalCSV.txt"
 KCBS_SEARCH_URL = "https://mms.kcbs.us/members/evr_search_ol_json.php"
+KCBS_EVENT_URL = "https://mms.kcbs.us/members/evr/reg_event_kcba.php?orgcode=KCBA&evid={}"
+
+# Pre-compiled patterns for parsing the html_content of each event
+_RE_NAME = re.compile(r'<b>([^<]+)</b>')
+_RE_DATE = re.compile(r'<i>([^<]+)</i>')
+_RE_LOC1 = re.compile(r'</a>([^<]+)<br[^>]*>UNITED STATES')
+_RE_LOC2 = re.compile(r'</a>([A-Za-z\s,]+[A-Z]{2}\s*\d*)<br')
+_RE_REP = re.compile(r'Reps?:\s*([^<]+)')
+# Distances and event ids are plain ASCII digits, match them with the ASCII-only tables
+_RE_DIST = re.compile(r'DIST:\s*(\d+)\s*mi', re.ASCII)
+_RE_VIEW = re.compile(r'viewEvent\((\d+)\)', re.ASCII)
+_RE_HREF = re.compile(r'href=["\']([^"\']*evr[^"\']*evid=(\d+)[^"\']*)["\']', re.ASCII)
+
+# Persistent HTTP(S) connections keyed by (scheme, host), reused across requests (keep-alive)
+_HTTP_CONNECTIONS = {}
+
+# Raised when the server has already closed a kept-alive connection
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+_MAX_REDIRECTS = 5
+
+def _get_connection(scheme, host):
+    """Get the pooled connection for scheme and host, creating it on first use"""
+    conn = _HTTP_CONNECTIONS.get((scheme, host))
+    if conn is None:
+        if scheme == 'https':
+            # Create SSL context that doesn't verify certificates (some sites need this)
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+            conn = http.client.HTTPSConnection(host, context=ctx)
+        else:
+            conn = http.client.HTTPConnection(host)
+        _HTTP_CONNECTIONS[(scheme, host)] = conn
+    return conn
+
+def _drop_connection(scheme, host):
+    """Close and forget the pooled connection for scheme and host so the next request reconnects"""
+    conn = _HTTP_CONNECTIONS.pop((scheme, host), None)
+    if conn is not None:
+        conn.close()
+
+def _send_get(url_parts, headers):
+    """Send a GET over the pooled connection and return the response with its body"""
+    target = url_parts.path or '/'
+    if url_parts.query:
+        target += f"?{url_parts.query}"
+    conn = _get_connection(url_parts.scheme, url_parts.netloc)
+    conn.request('GET', target, headers=headers)
+    response = conn.getresponse()
+    # Read the full body so the connection can be reused
+    return response, response.read()
+
+def _http_get(url, headers):
+    """GET url over the pooled connections, following redirects like urlopen does"""
+    for _ in range(_MAX_REDIRECTS + 1):
+        url_parts = urllib.parse.urlsplit(url)
+        try:
+            try:
+                response, data = _send_get(url_parts, headers)
+            except _STALE_CONNECTION_ERRORS:
+                # The server closed the kept-alive connection, retry once on a fresh one
+                _drop_connection(url_parts.scheme, url_parts.netloc)
+                response, data = _send_get(url_parts, headers)
+        except Exception:
+            # The connection may be left in a bad state, start fresh next time
+            _drop_connection(url_parts.scheme, url_parts.netloc)
+            raise
+        
+        location = response.getheader('Location')
+        if response.status not in _REDIRECT_STATUSES or not location:
+            return response, data
+        url = urllib.parse.urljoin(url, location)
+        if urllib.parse.urlsplit(url).netloc != url_parts.netloc:
+            # Don't send credentials to another host
+            headers = {k: v for k, v in headers.items() if k != 'Authorization'}
+    raise http.client.HTTPException(f"Too many redirects (more than {_MAX_REDIRECTS})")
+
+# Date range for the current day, keyed by date so it is recomputed after midnight
+_DATE_CACHE = {}
 
 def get_date_range():
     """Get date range: today to 1 year from today"""
-    today = datetime.now()
+    today = datetime.now().date()
+    if today in _DATE_CACHE:
+        return _DATE_CACHE[today]
     begin_date = today.strftime("%m/%d/%Y")
     end_date = (today + timedelta(days=365)).strftime("%m/%d/%Y")
+    # Only today's range is ever needed, drop earlier days
+    _DATE_CACHE.clear()
+    _DATE_CACHE[today] = (begin_date, end_date)
     return begin_date, end_date
 
 def search_events_by_radius(zipcode, radius):
@@ -60,13 +157,7 @@ def search_events_by_radius(zipcode, radius):
     print(f"Date range: {begin_date} to {end_date}")
     
     try:
-        # Create SSL context that doesn't verify certificates (some sites need this)
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
         
         # Add authentication if credentials are provided
         # Note: Currently the API endpoint doesn't require authentication, but credentials
@@ -75,35 +166,40 @@ def search_events_by_radius(zipcode, radius):
             # Create basic auth header if credentials are provided
             credentials = f"{KCBS_USERNAME}:{KCBS_PASSWORD}"
             encoded_credentials = base64.b64encode(credentials.encode()).decode()
-            req.add_header('Authorization', f'Basic {encoded_credentials}')
+            headers['Authorization'] = f'Basic {encoded_credentials}'
         
-        with urllib.request.urlopen(req, context=ctx) as response:
-            data = response.read().decode('utf-8')
-            
-            # The response might be JSONP, so we need to extract the JSON
-            if data.startswith('banner_callback_'):
-                # Extract JSON from JSONP callback
-                json_start = data.find('{')
-                json_end = data.rfind('}') + 1
-                if json_start != -1 and json_end > json_start:
-                    data = data[json_start:json_end]
+        response, data = _http_get(url, headers)
+        
+        if response.status != 200:
+            print(f"Error fetching events: HTTP {response.status} {response.reason}")
+            return None
+        
+        # The response might be JSONP, so we need to extract the JSON
+        if data.startswith(b'banner_callback_'):
+            # Extract JSON from JSONP callback: banner_callback_<n>(...);
+            # The payload sits between the first "(" right after the callback
+            # name and the closing ")" at the very end
+            json_start = data.find(b'(') + 1
+            json_end = data.rfind(b')')
+            if json_start and json_end > json_start:
+                data = data[json_start:json_end]
+        
+        try:
+            # Parse the bytes directly, skipping a utf-8 decode of the whole body
+            events_data = _json_loads(data)
+            return events_data
+        except json.JSONDecodeError as e:
+            # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+            print(f"Error parsing JSON: {e}")
+            print(f"Response data: {data[:500].decode('utf-8', errors='replace')}")
+            return None
             
-            try:
-                events_data = json.loads(data)
-                return events_data
-            except json.JSONDecodeError as e:
-                print(f"Error parsing JSON: {e}")
-                print(f"Response data: {data[:500]}")
-                return None
-                
     except Exception as e:
         print(f"Error fetching events: {e}")
         return None
 
 def parse_events(events_data):
     """Parse events data and format as pipe-delimited CSV with all required fields"""
-    import re
-    
     output_lines = []
     
     if not events_data:
@@ -114,96 +210,94 @@ def parse_events(events_data):
     events = []
     
     if isinstance(events_data, dict):
-        if 'features' in events_data:
-            # GeoJSON format
-            events = events_data['features']
-        elif 'events' in events_data:
-            events = events_data['events']
-        elif 'data' in events_data:
-            events = events_data['data']
-        else:
-            # Try to find any list in the data
-            for key, value in events_data.items():
-                if isinstance(value, list):
-                    events = value
-                    break
+        # GeoJSON 'features' is what the KCBS API returns, check it first
+        events = events_data.get('features') or events_data.get('events') or events_data.get('data') or []
     elif isinstance(events_data, list):
         events = events_data
     
     print(f"Found {len(events)} events")
     
+    # One tuple of fields per event, joined into lines once parsing is done
+    rows = []
+    
     for event in events:
-        try:
-            # Extract event information from GeoJSON feature
-            if isinstance(event, dict) and 'properties' in event:
-                props = event['properties']
-                name = props.get('name', '')
-                html_content = props.get('html_content', '')
-                
-                # Get event ID from GeoJSON feature (if available)
-                event_id = event.get('id') or props.get('id') or props.get('evid') or props.get('event_id')
-                
-                # Parse event name (from <b> tag or name field)
-                name_match = re.search(r'<b>([^<]+)</b>', html_content)
-                event_name = name_match.group(1).strip() if name_match else name
-                
-                # Parse distance (format: "DIST: 106 mi")
-                distance_match = re.search(r'DIST:\s*(\d+)\s*mi', html_content)
-                distance = distance_match.group(1) + " mi" if distance_match else ''
-                
-                # Parse date from html_content (format: "1/24/2026 - 1/24/2026" or similar)
-                date_match = re.search(r'<i>([^<]+)</i>', html_content)
-                dates = date_match.group(1).strip() if date_match else ''
-                
-                # Parse location from html_content (format: "Henrico, VA 23228")
-                # Look for text after </a> and before <br />UNITED STATES
-                # Pattern: </a>Henrico, VA 23228<br />UNITED STATES
-                location_match = re.search(r'</a>([^<]+)<br[^>]*>UNITED STATES', html_content)
-                if not location_match:
-                    # Try alternative pattern - look for city, state zip pattern
-                    location_match = re.search(r'</a>([A-Za-z\s,]+[A-Z]{2}\s*\d*)<br', html_content)
-                location = location_match.group(1).strip() if location_match else ''
-                
-                # Parse rep name (format: "Reps: BILL JONES" or "Rep : BILL JONES")
-                rep_match = re.search(r'Reps?:\s*([^<]+)', html_content)
-                rep_name = rep_match.group(1).strip() if rep_match else ''
-                
-                # Parse event URL from onclick attribute or event ID
-                event_url = ''
-                if event_id:
-                    # Use event ID directly if available
-                    event_url = f"https://mms.kcbs.us/members/evr/reg_event_kcba.php?orgcode=KCBA&evid={event_id}"
-                else:
-                    # Try to extract from onclick attribute (multiple patterns)
-                    # Pattern 1: onclick="viewEvent(39161)"
-                    event_id_match = re.search(r'onclick=["\']viewEvent\((\d+)\)["\']', html_content)
-                    if not event_id_match:
-                        # Pattern 2: onclick='viewEvent(39161)'
-                        event_id_match = re.search(r"onclick=['\"]viewEvent\((\d+)\)['\"]", html_content)
-                    if not event_id_match:
-                        # Pattern 3: viewEvent(39161) without quotes
-                        event_id_match = re.search(r'viewEvent\((\d+)\)', html_content)
-                    
-                    if event_id_match:
-                        event_id = event_id_match.group(1)
-                        event_url = f"https://mms.kcbs.us/members/evr/reg_event_kcba.php?orgcode=KCBA&evid={event_id}"
-                    else:
-                        # Try to find href attribute
-                        href_match = re.search(r'href=["\']([^"\']*evr[^"\']*evid=(\d+)[^"\']*)["\']', html_content)
-                        if href_match:
-                            event_url = href_match.group(1)
-                            if not event_url.startswith('http'):
-                                event_url = f"https://mms.kcbs.us{event_url}" if event_url.startswith('/') else f"https://mms.kcbs.us/{event_url}"
-                
-                # Format: Event Name|Distance|Dates|City, State Zip|Rep Name|Event URL
-                if event_name:
-                    output_lines.append(f"{event_name}|{distance}|{dates}|{location}|{rep_name}|{event_url}")
-                    print(f"  - {event_name} | {distance} | {dates} | {location} | {rep_name} | {event_url}")
-        except Exception as e:
-            print(f"Error parsing event: {e}")
-            import traceback
-            traceback.print_exc()
+        # Extract event information from GeoJSON feature, skipping malformed entries
+        if not isinstance(event, dict) or 'properties' not in event:
+            continue
+        props = event['properties']
+        if not isinstance(props, dict):
+            print(f"Error parsing event: properties is {type(props).__name__}, not dict")
+            continue
+        name = str(props.get('name') or '')
+        html_content = props.get('html_content') or ''
+        if not isinstance(html_content, str):
+            print(f"Error parsing event {name!r}: html_content is {type(html_content).__name__}, not str")
+            continue
+        
+        # Get event ID from GeoJSON feature (if available)
+        event_id = event.get('id') or props.get('id') or props.get('evid') or props.get('event_id')
+        
+        # Nothing to parse, skip straight to the name and event ID
+        if not html_content:
+            if name:
+                event_url = KCBS_EVENT_URL.format(event_id) if event_id else ''
+                rows.append((name, '', '', '', '', event_url))
             continue
+        
+        # Parse event name (from <b> tag or name field)
+        name_match = _RE_NAME.search(html_content)
+        event_name = name_match.group(1).strip() if name_match else name
+        
+        # Parse distance (format: "DIST: 106 mi")
+        distance_match = _RE_DIST.search(html_content)
+        distance = distance_match.group(1) + " mi" if distance_match else ''
+        
+        # Parse date from html_content (format: "1/24/2026 - 1/24/2026" or similar)
+        date_match = _RE_DATE.search(html_content)
+        dates = date_match.group(1).strip() if date_match else ''
+        
+        # Parse location from html_content (format: "Henrico, VA 23228")
+        # Look for text after </a> and before <br />UNITED STATES
+        # Pattern: </a>Henrico, VA 23228<br />UNITED STATES
+        location_match = _RE_LOC1.search(html_content)
+        if not location_match and '</a>' in html_content:
+            # Try alternative pattern - look for city, state zip pattern
+            location_match = _RE_LOC2.search(html_content)
+        location = location_match.group(1).strip() if location_match else ''
+        
+        # Parse rep name (format: "Reps: BILL JONES" or "Rep : BILL JONES")
+        rep_match = _RE_REP.search(html_content)
+        rep_name = rep_match.group(1).strip() if rep_match else ''
+        
+        # Parse event URL from onclick attribute or event ID
+        event_url = ''
+        if event_id:
+            # Use event ID directly if available
+            event_url = KCBS_EVENT_URL.format(event_id)
+        else:
+            # Try to extract from onclick attribute - a single unanchored pattern
+            # covers onclick="viewEvent(39161)", onclick='viewEvent(39161)' and
+            # a bare viewEvent(39161) call
+            event_id_match = _RE_VIEW.search(html_content)
+            if event_id_match:
+                event_id = event_id_match.group(1)
+                event_url = KCBS_EVENT_URL.format(event_id)
+            else:
+                # Try to find href attribute
+                href_match = _RE_HREF.search(html_content)
+                if href_match:
+                    event_url = href_match.group(1)
+                    if not event_url.startswith('http'):
+                        event_url = f"https://mms.kcbs.us{event_url}" if event_url.startswith('/') else f"https://mms.kcbs.us/{event_url}"
+        
+        # Format: Event Name|Distance|Dates|City, State Zip|Rep Name|Event URL
+        if event_name:
+            rows.append((event_name, distance, dates, location, rep_name, event_url))
+    
+    output_lines = ['|'.join(row) for row in rows]
+    # Report all parsed events with a single write
+    if VERBOSE and rows:
+        sys.stdout.write(''.join(f"  - {' | '.join(row)}\n" for row in rows))
     
     return output_lines
 
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for kcbs_browser_scraper.parse_events against sample KCBS html_content
+"""
+
+import contextlib
+import io
+import os
+import unittest
+
+# The scraper exits at import time without a zipcode
+os.environ.setdefault('ZIPCODE', '23228')
+
+import kcbs_browser_scraper
+
+# html_content of a single feature as returned by evr_search_ol_json.php
+SAMPLE_HTML = (
+    '<div class="evr_popup"><a href="javascript:void(0)" onclick="viewEvent(39161)">'
+    '<b>Smoke on the Water BBQ Festival</b></a><br />DIST: 106 mi<br />'
+    '<i>1/24/2026 - 1/25/2026</i><br />'
+    '<a href="javascript:void(0)" onclick="viewEvent(39161)">Details</a>'
+    'Henrico, VA 23228<br />UNITED STATES<br />Reps: BILL JONES, MARY SMITH<br /></div>'
+)
+
+EVENT_URL = "https://mms.kcbs.us/members/evr/reg_event_kcba.php?orgcode=KCBA&evid="
+
+
+def parse_html(html_content, name='Fallback Name'):
+    """Run parse_events on a single GeoJSON feature and return its output lines"""
+    feature = {'type': 'Feature', 'properties': {'name': name, 'html_content': html_content}}
+    return kcbs_browser_scraper.parse_events({'type': 'FeatureCollection', 'features': [feature]})
+
+
+class ParseEventsTest(unittest.TestCase):
+
+    def test_sample_feature(self):
+        self.assertEqual(parse_html(SAMPLE_HTML), [
+            "Smoke on the Water BBQ Festival|106 mi|1/24/2026 - 1/25/2026|"
+            f"Henrico, VA 23228|BILL JONES, MARY SMITH|{EVENT_URL}39161"
+        ])
+
+    def test_fields_inside_other_fields(self):
+        # Each field is searched independently, so one field can sit inside another
+        self.assertEqual(parse_html('<b>Ev</b><i>Reps: BILL JONES</i>'),
+                         ["Ev||Reps: BILL JONES||BILL JONES|"])
+        self.assertEqual(parse_html('<b>Reps: Z</b>'), ["Reps: Z||||Z|"])
+        self.assertEqual(parse_html('<b>E</b>Reps: viewEvent(5)'),
+                         [f"E||||viewEvent(5)|{EVENT_URL}5"])
+        self.assertEqual(parse_html('<b>E</b><b>Rep: x</b> Rep: 12'), ["E||||x|"])
+
+    def test_empty_html_content(self):
+        feature = {'id': 7, 'properties': {'name': 'Empty', 'html_content': ''}}
+        self.assertEqual(kcbs_browser_scraper.parse_events([feature]),
+                         [f"Empty|||||{EVENT_URL}7"])
+
+    def test_malformed_events_are_skipped(self):
+        events = ['garbage', {'properties': None}, {'properties': {'name': 'A', 'html_content': 5}}]
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertEqual(kcbs_browser_scraper.parse_events(events), [])
+        self.assertIn("Error parsing event: properties is NoneType, not dict", out.getvalue())
+        self.assertIn("Error parsing event 'A'", out.getvalue())
+
+    def test_location_and_href_fallbacks(self):
+        html_content = ("<b>Alt Ev</b><a>q</a>Richmond, VA 23220<br/>"
+                        "<a href='/members/evr/x.php?evid=55'>l</a>")
+        self.assertEqual(parse_html(html_content), [
+            "Alt Ev|||Richmond, VA 23220||https://mms.kcbs.us/members/evr/x.php?evid=55"
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()